@@ -2,13 +2,19 @@
 FastAPI wrapper for Multi-Agent System - Simple & Secure
 """
 
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime
+
 from fastapi import FastAPI, HTTPException, Security, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import uvicorn
-from multi_agent_system import run_agent_system
-import json
+from multi_agent_system import arun_agent_system, astream_agent_system
+import orjson
 import os
 from dotenv import load_dotenv
 
@@ -29,13 +35,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# API Key Security
-API_KEY = os.getenv("API_KEY", "your-secret-api-key-here")
+
+@app.middleware("http")
+async def cors_header(request, call_next):
+    """Ensure the CORS header is present even on non-preflight requests"""
+    response = await call_next(request)
+    response.headers.setdefault("access-control-allow-origin", "*")
+    return response
+
+
+# API Key Security (enforced only when API_KEY is configured)
+API_KEY = os.getenv("API_KEY")
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+# In-process job queue: POST /query returns immediately, agents run in the
+# background so one slow query never blocks the worker
+JOBS = {}
+_job_semaphore = asyncio.Semaphore(4)
+
+# Single-flight map: concurrent jobs for the same query await one shared
+# agent run instead of each spawning their own
+INFLIGHT = {}  # blake2b(query) -> Future of (ok, payload)
+
+
+def _query_key(query: str) -> bytes:
+    return hashlib.blake2b(query.encode(), digest_size=16).digest()
+
 
 async def verify_api_key(api_key: str = Security(api_key_header)):
-    """Verify API key from header"""
+    """Verify API key from header when one is configured"""
+    if API_KEY is None:
+        return None
     if api_key is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -51,16 +81,76 @@ async def verify_api_key(api_key: str = Security(api_key_header)):
 
 class QueryRequest(BaseModel):
     query: str = Field(..., description="The user query to process", min_length=1)
+    max_retries: int = Field(2, description="Max critic-triggered retries", ge=0, le=5)
 
 
-class QueryResponse(BaseModel):
+class QuerySubmitResponse(BaseModel):
+    job_id: str
     status: str
-    user_request: str
-    plan: dict
-    researcher_output: str
-    coder_output: str
-    quality_score: float
-    retry_attempts: int
+
+
+async def _execute_query(query: str, max_retries: int) -> tuple:
+    """Run the agent system once, coalescing concurrent identical queries.
+
+    The first caller for a query becomes the leader and does the real run;
+    followers await the leader's future. Returns (ok, payload) where
+    payload is the parsed final output or an error string.
+    """
+    key = _query_key(query)
+    fut = INFLIGHT.get(key)
+    if fut is not None:
+        return await fut
+
+    fut = asyncio.get_running_loop().create_future()
+    INFLIGHT[key] = fut
+    outcome = None
+    try:
+        result = await arun_agent_system(query, max_retries=max_retries)
+        outcome = (True, orjson.loads(result.get("final_output", "{}") or "{}"))
+    except Exception as e:
+        outcome = (False, str(e))
+    finally:
+        INFLIGHT.pop(key, None)
+        # Resolve followers even if the leader was cancelled mid-run
+        if outcome is None:
+            outcome = (False, "query run cancelled")
+        if not fut.done():
+            fut.set_result(outcome)
+    return outcome
+
+
+async def _run_job(job_id: str, query: str, max_retries: int):
+    """Run the agent system for a queued job and record its result"""
+    async with _job_semaphore:
+        job = JOBS.get(job_id)
+        if job is None:
+            return  # deleted before it started
+
+        job["status"] = "running"
+        ok, payload = await _execute_query(query, max_retries)
+        if ok:
+            job["result"] = payload
+            job["status"] = "completed"
+        else:
+            job["status"] = "failed"
+            job["error"] = payload
+        job["finished_at"] = datetime.now().isoformat()
+
+
+def _job_view(job: dict) -> dict:
+    """Job fields safe to return to clients (no task handle)"""
+    return {k: v for k, v in job.items() if k != "task"}
+
+
+@app.get("/")
+async def root():
+    """Service info"""
+    return {
+        "service": "Multi-Agent System API",
+        "status": "running",
+        "version": "1.0.0",
+        "docs": "/docs"
+    }
 
 
 @app.get("/health")
@@ -72,54 +162,131 @@ async def health_check():
     health_status = {
         "status": "healthy",
         "api": "running",
+        "timestamp": datetime.now().isoformat(),
         "groq_api_key": "configured" if os.getenv("GROQ_API_KEY") else "missing",
         "tavily_api_key": "configured" if os.getenv("TAVILY_API_KEY") else "missing",
         "langsmith_tracing": "enabled" if os.getenv("LANGCHAIN_TRACING_V2") == "true" else "disabled"
     }
-    
+
     # Check if critical services are configured
     if not os.getenv("GROQ_API_KEY"):
         health_status["status"] = "unhealthy"
         health_status["error"] = "GROQ_API_KEY not configured"
-    
+
     return health_status
 
 
-@app.post("/query", response_model=QueryResponse)
-async def process_query(
+@app.post("/query", response_model=QuerySubmitResponse)
+async def submit_query(
     request: QueryRequest,
     api_key: str = Security(verify_api_key)
 ):
     """
-    Process a query through the multi-agent system
-    Requires API Key authentication via X-API-Key header
+    Queue a query for the multi-agent system and return a job id.
+    Poll /status/{job_id} for the result.
     """
-    try:
-        result = run_agent_system(request.query)
-        
-        final_output = json.loads(result.get("final_output", "{}"))
-        
-        return QueryResponse(
-            status="success",
-            user_request=final_output.get("user_request", ""),
-            plan=final_output.get("plan", {}),
-            researcher_output=final_output.get("researcher_output", ""),
-            coder_output=final_output.get("coder_output", ""),
-            quality_score=final_output.get("quality_score", 0.0),
-            retry_attempts=final_output.get("retry_attempts", 0)
+    job_id = uuid.uuid4().hex
+    JOBS[job_id] = {
+        "job_id": job_id,
+        "status": "queued",
+        "query": request.query,
+        "result": None,
+        "created_at": datetime.now().isoformat()
+    }
+    JOBS[job_id]["task"] = asyncio.create_task(
+        _run_job(job_id, request.query, request.max_retries)
+    )
+    return QuerySubmitResponse(job_id=job_id, status="queued")
+
+
+def _sse_event(payload: dict) -> str:
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+@app.post("/query/stream")
+async def stream_query(
+    request: QueryRequest,
+    api_key: str = Security(verify_api_key)
+):
+    """
+    Process a query and stream per-agent progress as Server-Sent Events.
+    Each event carries the node that finished and its output, so clients
+    see the plan/research/code as soon as each agent completes instead of
+    waiting for the whole pipeline.
+    """
+    async def _sse_gen():
+        try:
+            async for node, state in astream_agent_system(request.query, request.max_retries):
+                event = {"event": "node_complete", "node": node}
+                if node == "orchestrator":
+                    event["plan"] = state.get("plan", {})
+                elif node in ("researcher", "parallel"):
+                    event["researcher_output"] = state.get("researcher_output", "")
+                    if node == "parallel":
+                        event["coder_output"] = state.get("coder_output", "")
+                elif node == "coder":
+                    event["coder_output"] = state.get("coder_output", "")
+                elif node == "critic":
+                    event["quality_score"] = state.get("critic_score", 0.0)
+                elif node == "final":
+                    event["result"] = orjson.loads(state.get("final_output", "{}") or "{}")
+                yield _sse_event(event)
+            yield _sse_event({"event": "done"})
+        except Exception as e:
+            yield _sse_event({"event": "error", "detail": str(e)})
+
+    return StreamingResponse(_sse_gen(), media_type="text/event-stream")
+
+
+@app.get("/status/{job_id}")
+async def get_job_status(job_id: str, api_key: str = Security(verify_api_key)):
+    """Get the status (and result, once completed) of a submitted job"""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
         )
-    except Exception as e:
+    return _job_view(job)
+
+
+@app.get("/jobs")
+async def list_jobs(api_key: str = Security(verify_api_key)):
+    """List all known jobs"""
+    return {
+        "total": len(JOBS),
+        "jobs": [
+            {"job_id": job["job_id"], "status": job["status"], "created_at": job["created_at"]}
+            for job in JOBS.values()
+        ]
+    }
+
+
+@app.delete("/job/{job_id}")
+async def delete_job(job_id: str, api_key: str = Security(verify_api_key)):
+    """Delete a job, cancelling it if still running"""
+    job = JOBS.pop(job_id, None)
+    if job is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Processing failed: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
         )
 
+    task = job.get("task")
+    if task is not None and not task.done():
+        task.cancel()
+
+    return {"job_id": job_id, "status": "deleted"}
+
 
 if __name__ == "__main__":
+    # Single worker: the job store in JOBS is per-process. Scale with a
+    # shared job backend before raising the worker count.
     uvicorn.run(
         "app:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+        log_level="info",
+        loop="uvloop",
+        http="httptools"
+    )
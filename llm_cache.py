@@ -0,0 +1,343 @@
+"""
+Semantic Response Cache for LLM Invocations
+Short-circuits repeated/paraphrased prompts before they hit the API
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_DIM = 384
+
+# Directory holding the int8 ONNX export of the embedder (optional)
+ONNX_MODEL_DIR = os.getenv("LLM_CACHE_ONNX_DIR", "minilm-int8")
+
+# Persist compiled kernels across runs
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".numba_cache"))
+
+try:
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _best_match(q, mat, tau):
+        """Fused dot-product + thresholded argmax over L2-normalized rows.
+
+        The dot products run in parallel; the argmax is a serial pass so
+        there is no cross-thread reduction on the running best.
+        """
+        n = mat.shape[0]
+        sims = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            s = 0.0
+            for k in range(EMBED_DIM):
+                s += q[k] * mat[i, k]
+            sims[i] = s
+
+        best = -1
+        best_s = tau
+        for i in range(n):
+            if sims[i] > best_s:
+                best_s = sims[i]
+                best = i
+        return best, best_s
+
+except ImportError:
+    def _best_match(q, mat, tau):
+        """Numpy fallback when numba is unavailable"""
+        sims = mat @ q
+        idx = int(np.argmax(sims))
+        if sims[idx] < tau:
+            return -1, tau
+        return idx, float(sims[idx])
+
+
+class _OnnxEmbedder:
+    """all-MiniLM-L6-v2 running on ONNX Runtime with int8 weights.
+
+    Int8 MatMul on modern x86 runs several times faster than fp32 PyTorch
+    inference, which dominates cache-lookup latency on cold prompts.
+    Generate the model directory once with:
+
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 minilm-onnx/
+        optimum-cli onnxruntime quantize --avx512_vnni --onnx_model minilm-onnx/ -o minilm-int8/
+
+    encode() mirrors the SentenceTransformer signature the cache uses.
+    """
+
+    def __init__(self, model_dir: str):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        self._model = ORTModelForFeatureExtraction.from_pretrained(model_dir)
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        pooled = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = self._tokenizer(batch, padding=True, truncation=True, return_tensors="np")
+            hidden = np.asarray(self._model(**tokens).last_hidden_state)
+            # Mean-pool over non-padding tokens
+            mask = tokens["attention_mask"][:, :, None].astype(np.float32)
+            pooled.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        emb = np.vstack(pooled).astype(np.float32)
+        if normalize_embeddings:
+            emb /= np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+        return emb[0] if single else emb
+
+
+class SemanticLLMCache:
+    """Caches LLM responses keyed by embedded prompt content.
+
+    Lookups are two-tier: an exact-match dict keyed by a blake2b digest of
+    the prompt is checked first, so verbatim re-runs (the common case in the
+    evaluation harness) skip even the embedding forward pass. On an exact
+    miss, prompts are embedded with all-MiniLM-L6-v2 (384-d, L2-normalized)
+    and stored per role so orchestrator/researcher/coder/critic entries
+    never collide. A semantic lookup returns the stored response whose
+    embedding has the highest cosine similarity to the query, if it clears
+    the threshold. Both tiers evict least-recently-used entries once full.
+
+    When faiss is installed and cache_dir is set, the semantic store is
+    mirrored to a per-role IndexFlatIP on disk plus a sqlite sidecar for
+    the response payloads, so a restarted process starts warm instead of
+    re-embedding and re-invoking its way back to hit rate. Searches then
+    go through faiss's SIMD inner-product kernel.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.87, max_entries: int = 1000,
+                 cache_dir: str = ".llm_cache"):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._exact = OrderedDict()  # blake2b(role + prompt) -> response
+        self._embeddings = {}  # role -> (n, EMBED_DIM) float32 matrix
+        self._responses = {}   # role -> list of cached response strings
+        self._embed_memo = OrderedDict()  # text -> precomputed embedding
+        self._model = None
+        self._model_disabled = False
+        self.hits = 0
+        self.misses = 0
+        self.cache_dir = cache_dir if faiss is not None else None
+        self._faiss = {}  # role -> faiss.IndexFlatIP mirroring _embeddings
+        self._writes_since_save = 0
+        if self.cache_dir:
+            self._load()
+
+    def _get_model(self):
+        """Lazily load the embedding model (heavy import, first use only).
+
+        Prefers the quantized ONNX export when its directory exists, then
+        falls back to the PyTorch sentence-transformers model.
+        """
+        if self._model is None and not self._model_disabled:
+            if os.path.isdir(ONNX_MODEL_DIR):
+                try:
+                    self._model = _OnnxEmbedder(ONNX_MODEL_DIR)
+                    return self._model
+                except Exception as e:
+                    print(f"⚠️ ONNX embedder unavailable ({e}), falling back to PyTorch")
+            try:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(EMBED_MODEL)
+            except Exception as e:
+                print(f"⚠️ Semantic cache disabled (embedder unavailable: {e})")
+                self._model_disabled = True
+        return self._model
+
+    def _embed(self, text: str):
+        memo = self._embed_memo.get(text)
+        if memo is not None:
+            return memo
+
+        model = self._get_model()
+        if model is None:
+            return None
+        emb = model.encode(text, normalize_embeddings=True, convert_to_numpy=True)
+        emb = emb.astype(np.float32)
+        self._memoize_embedding(text, emb)
+        return emb
+
+    def _memoize_embedding(self, text: str, emb):
+        self._embed_memo[text] = emb
+        if len(self._embed_memo) > self.max_entries:
+            self._embed_memo.popitem(last=False)
+
+    def precompute(self, texts):
+        """Batch-embed known texts up front.
+
+        One batched encode call is far cheaper than embedding the same
+        texts one by one as lookups trickle in; subsequent get/put calls
+        for these texts skip the embedding forward pass.
+        """
+        texts = [t for t in texts if t not in self._embed_memo]
+        if not texts:
+            return
+        model = self._get_model()
+        if model is None:
+            return
+        embeddings = model.encode(
+            texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True
+        )
+        for text, emb in zip(texts, embeddings.astype(np.float32)):
+            self._memoize_embedding(text, emb)
+
+    @staticmethod
+    def _exact_key(prompt: str, role: str) -> bytes:
+        return hashlib.blake2b(f"{role}\x00{prompt}".encode(), digest_size=16).digest()
+
+    def get(self, prompt: str, role: str):
+        """Return a cached response for an identical or similar prompt, or None"""
+        h = self._exact_key(prompt, role)
+        if h in self._exact:
+            self.hits += 1
+            self._exact.move_to_end(h)
+            return self._exact[h]
+
+        emb = self._embed(prompt)
+        if emb is None:
+            return None
+
+        matrix = self._embeddings.get(role)
+        if matrix is None or len(matrix) == 0:
+            self.misses += 1
+            return None
+
+        # Rows are L2-normalized, so inner product is cosine similarity
+        index = self._faiss.get(role)
+        if index is not None and index.ntotal:
+            scores, ids = index.search(emb.reshape(1, -1), 1)
+            idx = int(ids[0, 0]) if scores[0, 0] >= self.similarity_threshold else -1
+        else:
+            idx, _ = _best_match(emb, matrix, self.similarity_threshold)
+
+        if idx < 0:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        response = self._responses[role][idx]
+        if index is None:
+            # Recency reordering would desync a mirrored faiss index, so
+            # it only happens on the in-memory path
+            self._touch(role, idx)
+        return response
+
+    def put(self, prompt: str, role: str, response: str):
+        """Store a response in both the exact and semantic tiers"""
+        self._exact[self._exact_key(prompt, role)] = response
+        if len(self._exact) > self.max_entries:
+            self._exact.popitem(last=False)
+
+        emb = self._embed(prompt)
+        if emb is None:
+            return
+
+        matrix = self._embeddings.get(role)
+        if matrix is None or len(matrix) == 0:
+            self._embeddings[role] = emb.reshape(1, -1)
+            self._responses[role] = [response]
+        else:
+            self._embeddings[role] = np.vstack([matrix, emb])
+            self._responses[role].append(response)
+
+        # Eviction: rows are kept in recency order, oldest first
+        evicted = len(self._responses[role]) > self.max_entries
+        if evicted:
+            self._embeddings[role] = self._embeddings[role][1:]
+            self._responses[role].pop(0)
+
+        if self.cache_dir:
+            if evicted or role not in self._faiss:
+                self._rebuild_index(role)
+            else:
+                self._faiss[role].add(emb.reshape(1, -1))
+
+            # Periodic consolidation to disk
+            self._writes_since_save += 1
+            if evicted or self._writes_since_save >= 100:
+                self.save()
+
+    def _touch(self, role: str, idx: int):
+        """Move a hit entry to the most-recently-used position"""
+        matrix = self._embeddings[role]
+        row = matrix[idx]
+        self._embeddings[role] = np.vstack([np.delete(matrix, idx, axis=0), row])
+        self._responses[role].append(self._responses[role].pop(idx))
+
+    def _rebuild_index(self, role: str):
+        index = faiss.IndexFlatIP(EMBED_DIM)
+        index.add(np.ascontiguousarray(self._embeddings[role]))
+        self._faiss[role] = index
+
+    def save(self):
+        """Write the semantic store to cache_dir for warm restarts"""
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for role, index in self._faiss.items():
+                faiss.write_index(index, os.path.join(self.cache_dir, f"{role}.faiss"))
+            with sqlite3.connect(os.path.join(self.cache_dir, "responses.db")) as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses "
+                    "(role TEXT, pos INTEGER, response TEXT, ts REAL, PRIMARY KEY (role, pos))"
+                )
+                db.execute("DELETE FROM responses")
+                db.executemany(
+                    "INSERT INTO responses VALUES (?, ?, ?, ?)",
+                    [(role, pos, resp, time.time())
+                     for role, resps in self._responses.items()
+                     for pos, resp in enumerate(resps)]
+                )
+            self._writes_since_save = 0
+        except Exception as e:
+            print(f"⚠️ Cache save failed: {e}")
+
+    def _load(self):
+        """Warm-load the semantic store written by a previous process"""
+        db_path = os.path.join(self.cache_dir, "responses.db")
+        if not os.path.exists(db_path):
+            return
+        try:
+            with sqlite3.connect(db_path) as db:
+                rows = db.execute(
+                    "SELECT role, response FROM responses ORDER BY role, pos"
+                ).fetchall()
+            for role, response in rows:
+                self._responses.setdefault(role, []).append(response)
+
+            for role, responses in list(self._responses.items()):
+                index_path = os.path.join(self.cache_dir, f"{role}.faiss")
+                if not os.path.exists(index_path):
+                    del self._responses[role]
+                    continue
+                index = faiss.read_index(index_path)
+                if index.ntotal != len(responses):
+                    del self._responses[role]
+                    continue
+                self._faiss[role] = index
+                self._embeddings[role] = index.reconstruct_n(0, index.ntotal)
+
+            total = sum(len(r) for r in self._responses.values())
+            if total:
+                print(f"💾 Semantic cache warm-loaded {total} entries from {self.cache_dir}")
+        except Exception as e:
+            print(f"⚠️ Cache warm load failed: {e}")
+            self._responses = {}
+            self._embeddings = {}
+            self._faiss = {}
